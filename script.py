@@ -3,15 +3,38 @@
 
 import os
 import subprocess
-import paramiko
-import tqdm
 import argparse
 import logging
 import shutil
-import glob
+import threading
+import time
+import string
+import shlex
+import queue
+import concurrent.futures
 from datetime import datetime
 
 PART_SIZE = 6 * 1024 * 1024 * 1024  # 6GB in bytes
+TAR_BLOCKING_FACTOR = 2048  # 2048 * 512B = 1MiB records instead of tar's default 10KiB
+PIPE_BUFFER_SIZE = 1024 * 1024
+MBUFFER_SIZE = "256M"
+COMPRESSOR_NICENESS = 10
+TRANSFER_CHUNK_SIZE = 1024 * 1024
+PROGRESS_INTERVAL = 4 * 1024 * 1024  # bytes between progress updates
+PART_POLL_INTERVAL = 0.5  # seconds between checks for finished parts
+DEFAULT_LEVELS = {"gzip": 6, "zstd": 3}
+LEVEL_RANGES = {"gzip": (1, 9), "zstd": (1, 19)}
+BACKUP_EXTENSIONS = ("tar", "tar.gz", "tar.zst")
+SSH_KEEPALIVE_INTERVAL = 30  # seconds
+SSH_WINDOW_SIZE = 2 ** 27
+SSH_MAX_PACKET_SIZE = 2 ** 19
+# Share one multiplexed connection between every ssh/rsync call instead of a handshake each.
+# Compression is off because the data is already compressed.
+SSH_OPTIONS = ["-o", "Compression=no", "-o", "ControlMaster=auto", "-o", "ControlPath=~/.ssh/cm-%r@%h:%p", "-o", "ControlPersist=60s"]
+SSHD_MAX_SESSIONS = 10  # OpenSSH's default MaxSessions per connection
+# Bytes per SFTP read/write request (paramiko's default is 32KiB). OpenSSH's
+# sftp-server drops the session on messages over 256KiB, headers included.
+SFTP_MAX_REQUEST_SIZE = 255 * 1024
 
 def check_tmp_directory():
     tmp_dir = "/home/tmp/"
@@ -27,100 +50,520 @@ def check_tmp_directory():
         return False
     return True
 
+def get_tree_size(path):
+    total_size = 0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    # DirEntry caches the file type from the directory listing, so only regular files cost a stat
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total_size += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            # os.walk silently skipped unreadable directories too
+            continue
+    return total_size
+
 def get_directory_size(path):
     total_size = 0
-    for dirpath, dirnames, filenames in os.walk(path):
-        for f in filenames:
-            fp = os.path.join(dirpath, f)
-            if not os.path.islink(fp):
-                total_size += os.path.getsize(fp)
+    subdirs = []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total_size += entry.stat(follow_symlinks=False).st_size
+    except OSError:
+        # Same as os.walk and get_tree_size: a missing or unreadable root counts as empty
+        return 0
+
+    # Walking is bound by stat latency, and scandir/stat release the GIL, so subtrees can be walked side by side
+    with concurrent.futures.ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as pool:
+        total_size += sum(pool.map(get_tree_size, subdirs))
     return total_size
 
-def compress_directory(source_dir, verbose, use_gzip, part_size):
+def get_available_cpus():
+    # Respects taskset/cgroup CPU restrictions, unlike os.cpu_count()
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+def get_gzip_command(level, threads):
+    if shutil.which("pigz"):
+        # 1MiB blocks instead of pigz's default 128KiB: less coordination between threads, slightly better ratio
+        return ["pigz", "-p", str(threads), "-b", "1024", f"-{level}"]
+    logging.warning("pigz not found, falling back to single-threaded gzip")
+    return ["gzip", f"-{level}"]
+
+def get_compressor_command(compression, level, threads):
+    if compression == "none":
+        return None, "tar"
+    if compression == "zstd":
+        if shutil.which("zstd"):
+            # A 128MiB window (--long=27) still decompresses without extra flags
+            if level is None:
+                level = DEFAULT_LEVELS['zstd']
+            return ["zstd", f"-T{threads}", "--long=27", f"-{level}", "-"], "tar.zst"
+        logging.warning("zstd not found, falling back to gzip")
+        # zstd levels go up to 19, so don't carry a custom one over to gzip
+        level = None
+    if level is None:
+        level = DEFAULT_LEVELS['gzip']
+    return get_gzip_command(level, threads), "tar.gz"
+
+def log_stderr(process):
+    with process.stderr:
+        for line in process.stderr:
+            logging.warning(line.decode(errors='replace').rstrip())
+
+def start_pipeline(commands, stdout=subprocess.DEVNULL):
+    processes = []
+    readers = []
+    for i, cmd in enumerate(commands):
+        stdin = processes[-1].stdout if processes else None
+        last = i == len(commands) - 1
+        process = subprocess.Popen(cmd, bufsize=PIPE_BUFFER_SIZE, stdin=stdin, stdout=stdout if last else subprocess.PIPE, stderr=subprocess.PIPE)
+        # Only the next stage should hold the read end of the pipe
+        if stdin:
+            stdin.close()
+        # Drain stderr as it comes so a chatty stage can never block on a full pipe
+        reader = threading.Thread(target=log_stderr, args=(process,), daemon=True)
+        reader.start()
+        processes.append(process)
+        readers.append(reader)
+    return processes, readers
+
+def wait_pipeline(processes, readers, description):
+    try:
+        for process in processes:
+            process.wait()
+    except BaseException:
+        for process in processes:
+            process.kill()
+        raise
+    for reader in readers:
+        reader.join()
+
+    failed = []
+    for process in processes:
+        if process.args[0] == "tar" and process.returncode == 1:
+            # GNU tar exits with 1 when a file changed while it was being read, which is routine
+            # for a live directory; the archive is still complete, so only fatal errors (2) abort
+            logging.warning("tar reported that some files changed while being archived")
+        elif process.returncode != 0:
+            failed.append(process)
+    if failed:
+        for process in failed:
+            logging.error(f"{' '.join(process.args)} failed with return code {process.returncode}")
+        raise Exception(f"{description} failed")
+
+def get_archive_commands(source_dir, compression, level, threads):
+    compressor, extension = get_compressor_command(compression, level, threads)
+    # A large buffer on each side of the compressor keeps it busy through bursts of small
+    # files on the read side and network/disk stalls on the write side
+    buffer = ["mbuffer", "-q", "-m", MBUFFER_SIZE] if shutil.which("mbuffer") else None
+
+    commands = [["tar", "-b", str(TAR_BLOCKING_FACTOR), "-cf", "-", "-C", source_dir, "."]]
+    if compressor:
+        if buffer:
+            commands.append(buffer)
+        # Lower priority so the compressor doesn't starve interactive work on the same machine
+        commands.append(["nice", "-n", str(COMPRESSOR_NICENESS), *compressor])
+    if buffer:
+        commands.append(buffer)
+    return commands, extension
+
+def get_backup_name(source_dir):
+    return f"backup_{os.path.basename(source_dir)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+
+def get_remote_file_path(remote_path, filename):
+    if remote_path:
+        return os.path.join(remote_path, filename)
+    return f"/home/llucsm/backups/{filename}"
+
+def start_compression(source_dir, compression, level, threads, part_size):
     source_dir = os.path.abspath(os.path.expanduser(source_dir))
-    output_base = f"/home/tmp/backup_{os.path.basename(source_dir)}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    output_base = f"/home/tmp/{get_backup_name(source_dir)}"
 
-    tar_options = "cfz" if use_gzip else "cf"
-    extension = "tar.gz" if use_gzip else "tar"
+    commands, extension = get_archive_commands(source_dir, compression, level, threads)
+    commands.append(["split", "-b", str(part_size), "-", f"{output_base}.{extension}."])
 
-    cmd = f"tar -{tar_options} - -C {source_dir} . | split -b {part_size} - {output_base}.{extension}."
+    logging.info(f"Executing command: {' | '.join(' '.join(cmd) for cmd in commands)}")
 
-    logging.info(f"Executing command: {cmd}")
+    processes, readers = start_pipeline(commands)
+    return processes, readers, f"{os.path.basename(output_base)}.{extension}."
 
-    result = subprocess.run(cmd, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
-    
-    if result.returncode != 0:
-        logging.error(f"Compression failed with return code {result.returncode}")
-        logging.error(f"stderr: {result.stderr}")
-        raise Exception("Compression failed")
+def list_parts(prefix):
+    # A single read of /home/tmp/ finds every part; callers only stat the entries they need
+    with os.scandir("/home/tmp/") as entries:
+        return sorted((entry for entry in entries if entry.name.startswith(prefix)), key=lambda entry: entry.name)
+
+def compress_directory(source_dir, verbose, compression, level, threads, part_size):
+    processes, readers, prefix = start_compression(source_dir, compression, level, threads, part_size)
+    wait_pipeline(processes, readers, "Compression")
 
     logging.info("Compression completed successfully")
 
-    # Use glob to find all created backup files
-    files = glob.glob(f"{output_base}.{extension}.*")
+    files = [(entry.path, entry.stat().st_size) for entry in list_parts(prefix)]
     
     if not files:
         logging.warning("No output files were created")
     else:
-        logging.info(f"Created files: {', '.join(files)}")
+        logging.info(f"Created files: {', '.join(file for file, size in files)}")
 
     return files
 
-def transfer_file(local_path, verbose, host, remote_path):
-    if remote_path:
-        remote_file_path = os.path.join(remote_path, os.path.basename(local_path))
-    else:
-        remote_file_path = f"/home/llucsm/backups/{os.path.basename(local_path)}"
+def watch_parts(processes, readers, prefix, yielded):
+    while True:
+        finished = all(process.poll() is not None for process in processes)
+        parts = list_parts(prefix)
+        if finished:
+            # Raises before the tail of a broken archive gets uploaded
+            wait_pipeline(processes, readers, "Compression")
+            logging.info("Compression completed successfully")
+        else:
+            # split only opens the next part once the previous one is full, so every part but the newest is complete
+            parts = parts[:-1]
+
+        for part in parts:
+            if part.path not in yielded:
+                yielded.append(part.path)
+                logging.info(f"Part ready for transfer: {part.path}")
+                yield part.path, part.stat().st_size
 
+        if finished:
+            return
+        time.sleep(PART_POLL_INTERVAL)
+
+def compress_and_transfer(source_dir, verbose, compression, level, threads, part_size, host, remote_path, jobs):
+    # Upload each part as soon as split finishes it instead of waiting for the whole archive
+    processes, readers, prefix = start_compression(source_dir, compression, level, threads, part_size)
+    parts = []
     try:
-        ssh = paramiko.SSHClient()
-        ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh.connect(host)
+        failed = transfer_files(watch_parts(processes, readers, prefix, parts), verbose, host, remote_path, jobs, True)
+    except BaseException:
+        for process in processes:
+            process.kill()
+        # Parts are only removed locally after a successful upload, so the missing ones are on the remote
+        transferred = [os.path.basename(part) for part in parts if not os.path.exists(part)]
+        if transferred:
+            report_incomplete_backup(host, remote_path, f"Backup aborted. Parts already transferred: {', '.join(transferred)}")
+        raise
+
+    if failed:
+        report_incomplete_backup(host, remote_path, f"Parts that failed to transfer, kept locally: {', '.join(failed)}")
+
+def report_incomplete_backup(host, remote_path, detail):
+    logging.error(f"The backup in {host}:{get_remote_file_path(remote_path, '')} is INCOMPLETE. {detail}")
+    print(f"Warning: the backup on {host} is incomplete. Check backup.log for details.")
+
+def open_ssh(host):
+    # paramiko pulls in cryptography and is slow to import, so only load it when a connection is needed
+    import paramiko
+    paramiko.SFTPFile.MAX_REQUEST_SIZE = SFTP_MAX_REQUEST_SIZE
+
+    ssh = paramiko.SSHClient()
+    ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    ssh.connect(host)
 
-        sftp = ssh.open_sftp()
+    transport = ssh.get_transport()
+    transport.set_keepalive(SSH_KEEPALIVE_INTERVAL)
+    # Only affects channels opened from now on, including the SFTP one below
+    transport.default_window_size = SSH_WINDOW_SIZE
+    transport.default_max_packet_size = SSH_MAX_PACKET_SIZE
 
-        file_size = os.path.getsize(local_path)
-        
-        if verbose:
-            sftp.put(local_path, remote_file_path, callback=lambda transferred, total: print(f"Transferred: {transferred}/{total}"))
+    sftp = ssh.open_sftp()
+    return ssh, sftp
+
+class ProgressReporter:
+    # Updates the progress bar (or prints, in verbose mode) every PROGRESS_INTERVAL bytes
+    # instead of on every chunk, to keep progress output off the upload loop
+    def __init__(self, pbar, verbose, label, total=None):
+        self.pbar = pbar
+        self.verbose = verbose
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.reported = 0
+
+    def update(self, n):
+        self.done += n
+        if self.done - self.reported >= PROGRESS_INTERVAL:
+            self.report()
+
+    def close(self):
+        if self.done > self.reported:
+            self.report()
+
+    def report(self):
+        if self.verbose:
+            total = f"/{self.total}" if self.total is not None else ""
+            print(f"{self.label}: {self.done}{total}")
         else:
-            with tqdm.tqdm(total=file_size, unit='B', unit_scale=True, desc=f"Transferring {os.path.basename(local_path)}") as pbar:
-                sftp.put(local_path, remote_file_path, callback=lambda transferred, total: pbar.update(transferred - pbar.n))
+            self.pbar.update(self.done - self.reported)
+        self.reported = self.done
+
+def transfer_file(sftp, local_path, file_size, verbose, remote_path, position=0):
+    import tqdm
+
+    filename = os.path.basename(local_path)
+    remote_file_path = get_remote_file_path(remote_path, filename)
+
+    try:
+        with open(local_path, 'rb', buffering=TRANSFER_CHUNK_SIZE) as src, sftp.open(remote_file_path, 'wb') as dst, \
+                tqdm.tqdm(total=file_size, unit='B', unit_scale=True, desc=f"Transferring {filename}", position=position, disable=verbose) as pbar:
+            # Don't wait for the server to acknowledge each write before sending the next one
+            dst.set_pipelined(True)
+            if hasattr(os, "posix_fadvise"):
+                # The part is read front to back exactly once, so ask for aggressive readahead
+                os.posix_fadvise(src.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            progress = ProgressReporter(pbar, verbose, f"Transferred {filename}", file_size)
+            while chunk := src.read(TRANSFER_CHUNK_SIZE):
+                dst.write(chunk)
+                progress.update(len(chunk))
+            progress.close()
+
+            if hasattr(os, "posix_fadvise"):
+                # Nothing will read the part again, so give its page cache back to the compressor
+                os.posix_fadvise(src.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+        # Same sanity check sftp.put does once the upload is finished
+        remote_size = sftp.stat(remote_file_path).st_size
+        if remote_size != file_size:
+            raise IOError(f"size mismatch in transfer! {remote_size} != {file_size}")
 
-        sftp.close()
-        ssh.close()
         return True
     except Exception as e:
-        logging.error(f"Error transferring file {os.path.basename(local_path)}: {str(e)}")
+        logging.error(f"Error transferring file {filename}: {str(e)}")
+        return False
+
+def open_ssh_master(host):
+    # Connect once up front so every rsync attaches to the same master instead of racing to create one,
+    # and make sure the host can run rsync too: it only needs an SFTP server for the paramiko path
+    result = subprocess.run(["ssh", *SSH_OPTIONS, host, "command -v rsync"], stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        logging.warning(f"Could not run rsync on {host} over ssh (return code {result.returncode}): {result.stderr}")
+        return False
+    return True
+
+def rsync_file(local_path, verbose, host, remote_path, show_progress):
+    filename = os.path.basename(local_path)
+    cmd = ["rsync", "-a", "--partial", "--inplace", "-e", " ".join(["ssh", *SSH_OPTIONS])]
+    # rsync redraws its progress line in place, so parallel rsyncs would garble each other's output
+    if show_progress:
+        cmd.append("--progress" if verbose else "--info=progress2")
+    cmd += [local_path, f"{host}:{get_remote_file_path(remote_path, '')}"]
+
+    result = subprocess.run(cmd, stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode == 127:
+        logging.error(f"Error transferring file {filename}: rsync is not installed on {host}")
         return False
+    if result.returncode != 0:
+        logging.error(f"Error transferring file {filename}: rsync exited with return code {result.returncode}")
+        logging.error(f"stderr: {result.stderr}")
+        return False
+    if not show_progress:
+        print(f"Transferred {filename}")
+    return True
+
+def transfer_part(channels, file, size, verbose, host, remote_path, remove_after, show_progress=True):
+    logging.info(f"Starting transfer of {file}")
+    if channels is None:
+        success = rsync_file(file, verbose, host, remote_path, show_progress)
+    else:
+        # Each worker borrows a channel for the whole part so no two uploads share one
+        position, sftp = channels.get()
+        try:
+            success = transfer_file(sftp, file, size, verbose, remote_path, position)
+        finally:
+            channels.put((position, sftp))
+
+    if not success:
+        logging.error(f"Transfer of {file} failed. File not removed.")
+        return False
+
+    logging.info(f"Transfer of {file} completed")
+    if remove_after:
+        os.remove(file)
+        logging.info(f"Temporary file removed: {file}")
+    return True
+
+def transfer_files(files, verbose, host, remote_path, jobs, remove_after):
+    # Returns the parts that failed to upload
+    # Uploads are network-bound, so the only limit is how many channels sshd allows per connection
+    jobs = max(1, min(jobs, SSHD_MAX_SESSIONS))
+
+    if shutil.which("rsync") and open_ssh_master(host):
+        logging.info(f"Transferring files with {jobs} rsync processes")
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(transfer_part, None, file, size, verbose, host, remote_path, remove_after, jobs == 1): file for file, size in files}
+            return [file for future, file in futures.items() if not future.result()]
+
+    logging.warning("rsync not available locally or on the host, falling back to paramiko SFTP")
+    logging.info(f"Transferring files over {jobs} SFTP channels")
+
+    # One connection for every part instead of a handshake per part
+    ssh, sftp = open_ssh(host)
+    channels = queue.Queue()
+    channels.put((0, sftp))
+    try:
+        for position in range(1, jobs):
+            channels.put((position, ssh.open_sftp()))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = {pool.submit(transfer_part, channels, file, size, verbose, host, remote_path, remove_after): file for file, size in files}
+            return [file for future, file in futures.items() if not future.result()]
+    finally:
+        while not channels.empty():
+            channels.get()[1].close()
+        ssh.close()
+
+def get_part_suffix(index):
+    # Same names GNU split gives its parts: aa ... yz, then zaaa ... zyzz, then zzaaaa ...
+    prefix = ""
+    width = 2
+    while index >= 25 * 26 ** (width - 1):
+        index -= 25 * 26 ** (width - 1)
+        prefix += "z"
+        width += 1
+    suffix = ""
+    for _ in range(width):
+        index, letter = divmod(index, 26)
+        suffix = string.ascii_lowercase[letter] + suffix
+    return prefix + suffix
+
+class RemotePartWriter:
+    def __init__(self, sftp, remote_base, part_size):
+        if part_size <= 0:
+            raise ValueError(f"Part size must be positive, got {part_size}")
+        self.sftp = sftp
+        self.remote_base = remote_base
+        self.part_size = part_size
+        self.parts = []
+        self.current = None
+        self.written = 0
+
+    def write(self, data):
+        while data:
+            if self.current is None or self.written >= self.part_size:
+                self.next_part()
+            chunk = data[:self.part_size - self.written]
+            self.current.write(chunk)
+            self.written += len(chunk)
+            data = data[len(chunk):]
+
+    def next_part(self):
+        self.close()
+        path = f"{self.remote_base}{get_part_suffix(len(self.parts))}"
+        logging.info(f"Streaming to remote part {path}")
+        self.current = self.sftp.open(path, "wb")
+        self.current.set_pipelined(True)
+        self.parts.append(path)
+        self.written = 0
+
+    def close(self):
+        if self.current is not None:
+            self.current.close()
+            self.current = None
+
+def stream_to_sftp(sftp, commands, verbose, part_size, host, remote_base):
+    import tqdm
+
+    processes, readers = start_pipeline(commands, stdout=subprocess.PIPE)
+    writer = RemotePartWriter(sftp, remote_base, part_size)
+    try:
+        with tqdm.tqdm(unit='B', unit_scale=True, desc=f"Streaming to {host}", disable=verbose) as pbar:
+            progress = ProgressReporter(pbar, verbose, "Streamed")
+            while chunk := processes[-1].stdout.read(PIPE_BUFFER_SIZE):
+                writer.write(chunk)
+                progress.update(len(chunk))
+            progress.close()
+        writer.close()
+    except BaseException:
+        for process in processes:
+            process.kill()
+        raise
+    finally:
+        processes[-1].stdout.close()
+    wait_pipeline(processes, readers, "Streaming")
+
+    logging.info(f"Streamed parts: {', '.join(writer.parts)}")
+
+def stream_directory(source_dir, verbose, compression, level, threads, part_size, host, remote_path):
+    source_dir = os.path.abspath(os.path.expanduser(source_dir))
+    commands, extension = get_archive_commands(source_dir, compression, level, threads)
+    remote_base = get_remote_file_path(remote_path, f"{get_backup_name(source_dir)}.{extension}.")
+
+    if not shutil.which("ssh"):
+        logging.warning("ssh not found, streaming through paramiko SFTP")
+        logging.info(f"Streaming command: {' | '.join(' '.join(cmd) for cmd in commands)} to {host}:{remote_base}*")
+        ssh, sftp = open_ssh(host)
+        try:
+            stream_to_sftp(sftp, commands, verbose, part_size, host, remote_base)
+        finally:
+            sftp.close()
+            ssh.close()
+        return
+
+    # The archive goes straight from the compressor into the ssh socket and is split on the remote side
+    commands.append(["ssh", *SSH_OPTIONS, host, f"split -b {part_size} - {shlex.quote(remote_base)}"])
+    logging.info(f"Streaming command: {' | '.join(' '.join(cmd) for cmd in commands)}")
+
+    processes, readers = start_pipeline(commands)
+    wait_pipeline(processes, readers, "Streaming")
 
 def get_transfer_only_files():
     tmp_dir = "/home/tmp/"
-    return glob.glob(f"{tmp_dir}backup_*.tar.gz.*")
+    if not os.path.isdir(tmp_dir):
+        return []
+    # The listing and the sizes come from a single directory scan, so parts aren't stat'ed again before upload
+    with os.scandir(tmp_dir) as entries:
+        return sorted((entry.path, entry.stat().st_size) for entry in entries
+                      if entry.name.startswith("backup_") and any(f".{extension}." in entry.name for extension in BACKUP_EXTENSIONS) and entry.is_file())
 
 def print_summary(args):
     summary = ["Summary of actions:"]
     
+    if args.compression == "none":
+        compression = "- Without compression (plain tar)"
+    else:
+        compression = f"- Using {args.compression} compression"
+    
     if args.transfer_only:
         summary.append("- Transfer existing backup files from /home/tmp/ to the specified host")
+    elif args.stream:
+        summary.append(f"- Compress the directory: {args.source}")
+        summary.append(compression)
+        summary.append(f"- Stream the archive directly to {args.host} without temporary files")
     elif args.compress_only:
         summary.append(f"- Compress the directory: {args.source}")
         summary.append("- Files will be saved in /home/tmp/")
-        if args.gzip:
-            summary.append("- Using gzip compression")
+        summary.append(compression)
     else:
         summary.append(f"- Compress the directory: {args.source}")
-        if args.gzip:
-            summary.append("- Using gzip compression")
-        summary.append(f"- Transfer compressed files to {args.host}")
+        summary.append(compression)
+        summary.append(f"- Transfer compressed files to {args.host} as soon as each part is written")
         summary.append("- Remove temporary files after successful transfer")
     
     if args.verbose:
         summary.append("- Verbose mode: Detailed output will be displayed")
     
+    if args.level is not None:
+        summary.append(f"- Using compression level {args.level}")
+    
+    if args.threads != get_available_cpus():
+        summary.append(f"- Using {args.threads} compression threads")
+    
     if args.part_size:
         summary.append(f"- Using custom part size: {args.part_size} bytes")
     
+    if args.jobs != 4 and not args.compress_only and not args.stream:
+        summary.append(f"- Uploading up to {args.jobs} parts in parallel")
+    
     if args.host != 'home_server':
         summary.append(f"- Using custom host: {args.host}")
     
@@ -143,16 +586,44 @@ def main():
     parser = argparse.ArgumentParser(prog="Acrilique's backup script", description="Backup and transfer a specified directory to the home_server host", epilog="The home_server host should have a folder called /home/llucsm/backups/ to store the files")
     parser.add_argument("-v", "--verbose", action="store_true", help="Print detailed output")
     parser.add_argument("-t", "--transfer-only", action="store_true", help="Transfer existing files without compression")
-    parser.add_argument("-z", "--gzip", action="store_true", help="Use gzip compression (adds 'z' to tar command)")
+    compression = parser.add_mutually_exclusive_group()
+    compression.add_argument("-z", "--gzip", dest="compression", action="store_const", const="gzip", help="Use gzip compression (multi-threaded through pigz when available)")
+    compression.add_argument("--zstd", dest="compression", action="store_const", const="zstd", help="Use multi-threaded zstd compression (default)")
+    compression.add_argument("--raw", "--no-compress", dest="compression", action="store_const", const="none", help="Don't compress the archive, for fast links or already compressed data")
+    parser.add_argument("-l", "--level", type=int, help="Compression level (default: 3 for zstd, 6 for gzip)")
+    parser.add_argument("--threads", type=int, default=get_available_cpus(), help="Compression threads (default: CPUs available to the script)")
     parser.add_argument("-c", "--compress-only", action="store_true", help="Compress without transferring")
+    parser.add_argument("--stream", action="store_true", help="Stream the archive to the host without writing parts to /home/tmp/")
     parser.add_argument("-s", "--source", default="~", help="Source directory to backup (default: home directory)")
     parser.add_argument("-p", "--part-size", type=int, default=PART_SIZE, help="Part size in bytes (default: 6GB)")
+    parser.add_argument("-j", "--jobs", type=int, default=4, help="Number of parts to upload in parallel (default: 4)")
     parser.add_argument("--host", default="home_server", help="Host to send the files to (default: home_server)")
     parser.add_argument("--remote-path", help="Absolute remote path to send the files to (default: /home/llucsm/backups/)")
+    parser.set_defaults(compression="zstd")
     args = parser.parse_args()
 
+    if args.part_size <= 0:
+        parser.error("--part-size must be a positive number of bytes")
+
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    if args.threads < 1:
+        parser.error("--threads must be at least 1")
+
+    if args.level is not None:
+        if args.compression == "none":
+            parser.error("--level can't be used with --raw")
+        low, high = LEVEL_RANGES[args.compression]
+        if not low <= args.level <= high:
+            parser.error(f"{args.compression} compression level must be between {low} and {high}")
+
     logging.basicConfig(filename='backup.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+    if args.jobs > SSHD_MAX_SESSIONS:
+        logging.warning(f"Capping --jobs {args.jobs} to {SSHD_MAX_SESSIONS}, sshd's default MaxSessions")
+        args.jobs = SSHD_MAX_SESSIONS
+
     # Print summary and get user confirmation
     print_summary(args)
     if not get_user_confirmation():
@@ -160,6 +631,16 @@ def main():
         return
 
     try:
+        if args.stream:
+            if args.transfer_only or args.compress_only:
+                logging.error("Cannot use --stream with --transfer-only or --compress-only")
+                print("Error: Cannot use --stream with --transfer-only or --compress-only")
+                return
+            logging.info("Starting streaming backup")
+            stream_directory(args.source, args.verbose, args.compression, args.level, args.threads, args.part_size, args.host, args.remote_path)
+            logging.info("Streaming backup completed")
+            return
+
         if args.transfer_only:
             if args.compress_only:
                 logging.error("Cannot use both --transfer-only and --compress-only options")
@@ -171,27 +652,22 @@ def main():
                 logging.warning("No files found for transfer in /home/tmp/")
                 print("No files found for transfer in /home/tmp/")
                 return
-        else:
-            logging.info("Starting compression")
-            if not check_tmp_directory():
-                raise Exception("Cannot proceed due to issues with /home/tmp/")
-            files_to_transfer = compress_directory(args.source, args.verbose, args.gzip, args.part_size)
-
-        logging.info(f"Files to transfer: {', '.join(files_to_transfer)}")
-
-        if not args.compress_only:
-            for file in files_to_transfer:
-                logging.info(f"Starting transfer of {file}")
-                if transfer_file(file, args.verbose, args.host, args.remote_path):
-                    logging.info(f"Transfer of {file} completed")
-                    if not args.transfer_only:
-                        os.remove(file)
-                        logging.info(f"Temporary file removed: {file}")
-                else:
-                    logging.error(f"Transfer of {file} failed. File not removed.")
-        else:
+            logging.info(f"Files to transfer: {', '.join(file for file, size in files_to_transfer)}")
+            failed = transfer_files(files_to_transfer, args.verbose, args.host, args.remote_path, args.jobs, False)
+            if failed:
+                report_incomplete_backup(args.host, args.remote_path, f"Parts that failed to transfer: {', '.join(failed)}")
+            return
+
+        logging.info("Starting compression")
+        if not check_tmp_directory():
+            raise Exception("Cannot proceed due to issues with /home/tmp/")
+
+        if args.compress_only:
+            compress_directory(args.source, args.verbose, args.compression, args.level, args.threads, args.part_size)
             logging.info("Compression completed. Files not transferred due to --compress-only option.")
             print("Compression completed. Files not transferred due to --compress-only option.")
+        else:
+            compress_and_transfer(args.source, args.verbose, args.compression, args.level, args.threads, args.part_size, args.host, args.remote_path, args.jobs)
 
     except Exception as e:
         logging.error(f"An error occurred: {str(e)}")